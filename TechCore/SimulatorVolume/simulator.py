@@ -134,6 +134,23 @@ class Sim:
         key, res = self.strategy_updates_queue.pop()
         return key, res
 
+    def tick_batch(self, until_ts: float) -> List[Tuple[float, Optional[List[Union[OwnTrade, MdUpdate]]]]]:
+        """
+            Collect consecutive ticks in one call
+
+            Returns every (receive_ts, updates) pair with receive_ts below
+            `until_ts`, plus the first one at or beyond it so the caller
+            always makes progress. Only safe while the caller is guaranteed
+            not to act before `until_ts`: the updates are materialized
+            eagerly, so orders placed after this call cannot affect them.
+        """
+        batch = []
+        while True:
+            receive_ts, updates = self.tick()
+            batch.append((receive_ts, updates))
+            if updates is None or receive_ts >= until_ts:
+                return batch
+
     def execute_last_order(self) -> None:
         """
             this function tries to execute self.last order aggressively
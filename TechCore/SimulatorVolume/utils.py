@@ -112,3 +112,35 @@ class PriorQueue:
 
     def min_key(self):
         return self._min_key
+
+
+class LogBuffer:
+    """
+    Struct-of-arrays log storage
+
+    Preallocated float64 arrays with a per-name write index instead of a dict
+    of Python lists: appends write straight into the arrays (no PyFloat
+    boxing, no list reallocation) and capacity doubles on overflow.
+    """
+    def __init__(self, names: List[str], capacity: int = 1024) -> None:
+        self._arrs: Dict[str, np.ndarray] = {name: np.empty(capacity, dtype=np.float64) for name in names}
+        self._n: Dict[str, int] = {name: 0 for name in names}
+
+    def append(self, name: str, value: float) -> None:
+        arr = self._arrs[name]
+        n = self._n[name]
+        if n == arr.size:
+            arr = np.resize(arr, 2 * arr.size)
+            self._arrs[name] = arr
+        arr[n] = value
+        self._n[name] = n + 1
+
+    def append_row(self, **values) -> None:
+        for name, value in values.items():
+            self.append(name, value)
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self._arrs[name][:self._n[name]]
+
+    def asdict(self) -> Dict[str, np.ndarray]:
+        return {name: self[name] for name in self._arrs}